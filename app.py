@@ -1,5 +1,7 @@
+import os
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 
@@ -27,18 +29,164 @@ st.markdown("*Strategic data-driven insights for streetcar operations management
 
 
 # Load data
-@st.cache_data
-def load_data():
-    df = pd.read_csv('data/TTC_Feature_Engineered_2014_2025.csv')
+DATA_PATH = 'data/TTC_Feature_Engineered_2014_2025.parquet'
+
+
+# Keyed on the file path and its modification time and persisted to Streamlit's
+# disk cache (~/.streamlit/cache, which must be writable), so a server restart
+# reuses the prepared frame unless the file has changed since it was cached
+@st.cache_data(persist='disk', ttl=None, show_spinner=False)
+def load_data(path, mtime):
+    # Parquet keeps the compact dtypes; only read the columns the dashboard uses
+    # (regenerate the file with convert_to_parquet.py when the CSV changes)
+    df = pd.read_parquet(
+        path,
+        columns=['route', 'hour', 'weekday', 'delay_bin', 'min_delay'],
+        engine='pyarrow'
+    )
+    
+    # The app relies on these compact dtypes (ordered severity codes, int8 keys);
+    # a file written by convert_to_parquet.py already has them
+    df = df.astype({
+        'hour': 'int8',
+        'weekday': 'int8',
+        'min_delay': 'float32',
+        'route': 'category',
+        'delay_bin': pd.CategoricalDtype(['Low', 'Medium', 'High', 'Severe'], ordered=True)
+    })
+    
+    # Keep route categories sorted so the route picker can use them as-is
+    if not df['route'].cat.categories.is_monotonic_increasing:
+        df['route'] = df['route'].cat.reorder_categories(sorted(df['route'].cat.categories))
+    
+    # Numeric severity weight so priority scoring is a single sum
+    # (an unrecognized or missing delay_bin scores 0, like Low)
+    df['severity_weight'] = df['delay_bin'].map({'Severe': 3, 'High': 2, 'Medium': 1, 'Low': 0}).fillna(0).astype('int8')
     return df
 
 
+# One shared, read-only frame for all reruns and sessions; cache_data alone
+# hands every caller its own deserialized copy. It is loaded once per server
+# process, so a regenerated data file is picked up on the next restart
+@st.cache_resource
+def get_incidents():
+    return load_data(DATA_PATH, os.path.getmtime(DATA_PATH))
+
+
+# The incidents sorted by hour (stable, so each hour keeps file order) and the
+# row where each hour starts; an hour-range filter is then one contiguous slice
+@st.cache_resource
+def get_hour_sorted():
+    df = get_incidents()
+    by_hour = df.iloc[np.argsort(df['hour'].to_numpy(), kind='stable')]
+    hour_starts = np.searchsorted(by_hour['hour'].to_numpy(), np.arange(25))
+    return by_hour, hour_starts
+
+
+# Full-dataset figures the metrics compare against; df never changes after load
+@st.cache_data
+def compute_baselines(_df):
+    return {
+        'n': len(_df),
+        'avg_delay': float(_df['min_delay'].mean()),
+        'top_routes': _df['route'].value_counts().head(5).index.tolist()
+    }
+
+
+# Priority scores only depend on the full dataset, so compute them once
+@st.cache_data
+def compute_priority(_df):
+    # Calculate priority score for each route-time combination
+    priority_df = _df.groupby(['route', 'hour'], observed=True, sort=False).agg(
+        incidents=('delay_bin', 'size'),
+        severity_score=('severity_weight', 'sum')
+    ).reset_index()
+    
+    # Priority score weighs both volume and severity (one dot product over a C-contiguous block)
+    counts = np.ascontiguousarray(priority_df[['incidents', 'severity_score']].to_numpy(dtype=np.float64))
+    priority_df['priority_score'] = counts @ np.array([0.6, 0.4])
+    priority_df = priority_df.sort_values('priority_score', ascending=False)
+    
+    hourly_priority = priority_df.groupby('hour', observed=True)['priority_score'].sum().reset_index()
+    top_routes = priority_df.groupby('route', observed=True, sort=False)['priority_score'].sum().nlargest(3).index.tolist()
+    return priority_df, hourly_priority, top_routes
+
+
+# Incidents per route/hour split by severity; the deep-dive tabs slice this
+# (every severity gets a column, in category order, even if it never occurs)
+@st.cache_data
+def compute_route_hour_counts(_df):
+    counts = _df.groupby(['route', 'hour', 'delay_bin'], observed=True).size().unstack(fill_value=0)
+    return counts.reindex(columns=_df['delay_bin'].cat.categories, fill_value=0)
+
+
+# One route's per-hour severity counts for a time window; only a few
+# (route, window) pairs are ever requested, so the cache stays tiny
+@st.cache_data
+def route_window(_route_hour_counts, route, start_hour, end_hour):
+    return _route_hour_counts.loc[route].loc[start_hour:end_hour]
+
+
+# Sidebar filters are applied in one cached step, keyed on the widget values;
+# each entry is a whole frame shared by all sessions, so keep only the recent ones
+@st.cache_data(max_entries=32)
+def filter_data(_df, _by_hour, _hour_starts, selected_routes, selected_hours, selected_severity):
+    all_hours = selected_hours == (0, 23)
+    all_routes = 'All' in selected_routes
+    # Selecting every severity still drops rows with no (or an unknown) delay_bin,
+    # so it can only skip the mask when there are no such rows
+    all_severity = not selected_severity or (
+        set(selected_severity) >= set(_df['delay_bin'].cat.categories) and not _df['delay_bin'].hasnans
+    )
+    
+    # Default filters keep every row, so skip the masking entirely
+    if all_hours and all_routes and all_severity:
+        return _df
+    
+    # Start from the rows in the selected hours (a slice of the hour-sorted
+    # frame found with two searchsorted lookups) and narrow them down
+    if all_hours:
+        window = _df
+    else:
+        window = _by_hour.iloc[_hour_starts[selected_hours[0]]:_hour_starts[selected_hours[1] + 1]]
+    
+    # Route and severity masks compare integer category codes, not strings,
+    # and are combined into a single boolean index
+    masks = []
+    if not all_routes:
+        route_codes = window['route'].cat.categories.get_indexer(selected_routes)
+        masks.append(np.isin(window['route'].cat.codes.to_numpy(), route_codes))
+    if not all_severity:
+        severity_codes = window['delay_bin'].cat.categories.get_indexer(selected_severity)
+        masks.append(np.isin(window['delay_bin'].cat.codes.to_numpy(), severity_codes))
+    if masks:
+        window = window.iloc[np.logical_and.reduce(masks)]
+    return window
+
+
+# Key metrics for one filter state, read straight off the filtered columns' arrays;
+# filter_key only identifies the filter state for the cache
+@st.cache_data
+def summarize(_filtered_df, filter_key):
+    route_categories = _filtered_df['route'].cat.categories
+    route_counts = np.bincount(_filtered_df['route'].cat.codes.to_numpy(), minlength=len(route_categories))
+    top = int(route_counts.argmax())
+    return {
+        'avg_delay': float(_filtered_df['min_delay'].mean()),
+        'high_severity': int((_filtered_df['delay_bin'].cat.codes.to_numpy() >= 2).sum()),  # High or Severe
+        'top_route': route_categories[top],
+        'top_route_count': int(route_counts[top]),
+        'route_counts': route_counts
+    }
+
+
 # Show loading message
 with st.spinner('Loading data...'):
-    df = load_data()
+    df = get_incidents()
+    base = compute_baselines(df)
 
 
-st.success(f"Loaded {len(df):,} incidents from 2014-2025")
+st.success(f"Loaded {base['n']:,} incidents from 2014-2025")
 
 
 # Sidebar filters
@@ -47,7 +195,7 @@ st.sidebar.markdown("*Use these to filter the data*")
 
 
 # Route filter
-all_routes = sorted(df['route'].unique().tolist())
+all_routes = df['route'].cat.categories.tolist()
 selected_routes = st.sidebar.multiselect(
     "📍 Select Routes",
     options=['All'] + all_routes,
@@ -81,28 +229,15 @@ st.sidebar.caption("Filters apply to all visualizations below")
 
 
 # Apply filters
-filtered_df = df.copy()
-
-
-# Apply route filter
-if 'All' not in selected_routes:
-    filtered_df = filtered_df[filtered_df['route'].isin(selected_routes)]
-
-
-# Apply hour filter
-filtered_df = filtered_df[
-    (filtered_df['hour'] >= selected_hours[0]) & 
-    (filtered_df['hour'] <= selected_hours[1])
-]
-
-
-# Apply severity filter
-if selected_severity:
-    filtered_df = filtered_df[filtered_df['delay_bin'].isin(selected_severity)]
+# Sorted, so picking the same routes/severities in another order reuses the cache entry
+filter_key = (tuple(sorted(selected_routes)), tuple(selected_hours), tuple(sorted(selected_severity)))
+by_hour, hour_starts = get_hour_sorted()
+filtered_df = filter_data(df, by_hour, hour_starts, *filter_key)
+summary = summarize(filtered_df, filter_key)
 
 
 # Show filtered count
-st.info(f"Showing **{len(filtered_df):,}** of {len(df):,} total incidents ({len(filtered_df)/len(df)*100:.1f}%)")
+st.info(f"Showing **{len(filtered_df):,}** of {base['n']:,} total incidents ({len(filtered_df)/base['n']*100:.1f}%)")
 
 
 # Key metrics
@@ -117,24 +252,23 @@ with col1:
     st.metric(
         label="Total Incidents",
         value=f"{len(filtered_df):,}",
-        delta=f"{len(filtered_df) - len(df):,} from total",
+        delta=f"{len(filtered_df) - base['n']:,} from total",
         delta_color="inverse"
     )
 
 
 with col2:
-    avg_delay = filtered_df['min_delay'].mean()
-    overall_avg = df['min_delay'].mean()
+    avg_delay = summary['avg_delay']
     st.metric(
         label="Avg Delay (min)",
         value=f"{avg_delay:.1f}",
-        delta=f"{avg_delay - overall_avg:.1f}",
+        delta=f"{avg_delay - base['avg_delay']:.1f}",
         delta_color="inverse"
     )
 
 
 with col3:
-    high_severity = filtered_df['delay_bin'].isin(['High', 'Severe']).sum()
+    high_severity = summary['high_severity']
     high_severity_pct = (high_severity / len(filtered_df) * 100) if len(filtered_df) > 0 else 0
     st.metric(
         label="High Severity %",
@@ -145,8 +279,7 @@ with col3:
 
 with col4:
     if len(filtered_df) > 0:
-        top_route = filtered_df['route'].value_counts().index[0]
-        top_count = filtered_df['route'].value_counts().values[0]
+        top_route, top_count = summary['top_route'], summary['top_route_count']
         st.metric(
             label="Most Impacted Route",
             value=f"{top_route}",
@@ -162,24 +295,36 @@ st.subheader("📍 Route Analysis")
 
 
 top_n = 10
-route_counts = filtered_df['route'].value_counts().head(top_n)
+route_counts = summary['route_counts']
+
 
+# Partial sort: pick the top N category codes, then order just those (ties in route order)
+top_idx = np.arange(len(route_counts))
+if len(route_counts) > top_n:
+    top_idx = np.sort(np.argpartition(-route_counts, top_n)[:top_n])
+top_idx = top_idx[np.argsort(-route_counts[top_idx], kind='stable')]
+top_idx = top_idx[route_counts[top_idx] > 0]
+route_labels = df['route'].cat.categories[top_idx].tolist()
+route_count_values = route_counts[top_idx]
 
-if len(route_counts) > 0:
+
+# Figures are cached on the values they plot, so reruns that don't change them skip the rebuild
+@st.cache_data
+def make_route_bar(routes, counts, top_n):
     # Create bar chart with professional colors
     fig = px.bar(
-        x=route_counts.index,
-        y=route_counts.values,
+        x=routes,
+        y=counts,
         labels={'x': 'Route', 'y': 'Number of Incidents'},
         title=f"Top {top_n} Routes by Incident Count",
-        text=route_counts.values
+        text=counts
     )
     
     # Use professional color palette
     colors = ['#c0392b', '#e67e22', '#f39c12', '#27ae60', '#3498db', 
               '#9b59b6', '#1abc9c', '#34495e', '#e74c3c', '#16a085']
     fig.update_traces(
-        marker_color=colors[:len(route_counts)],
+        marker_color=colors[:len(routes)],
         textposition='outside'
     )
     
@@ -190,11 +335,16 @@ if len(route_counts) > 0:
         height=500,  # Increased height so numbers don't cut off
         xaxis=dict(
             tickmode='array',
-            tickvals=list(route_counts.index),
-            ticktext=list(route_counts.index),
+            tickvals=routes,
+            ticktext=routes,
         ),
         margin=dict(t=80)  # Extra top margin for numbers
     )
+    return fig
+
+
+if len(route_labels) > 0:
+    fig = make_route_bar(route_labels, route_count_values, top_n)
     st.plotly_chart(fig, use_container_width=True)
 else:
     st.warning("No data to display with current filters")
@@ -205,35 +355,42 @@ st.markdown("---")
 st.subheader("⏰ When Do Incidents Happen?")
 
 
-# Create pivot table for heatmap
-heatmap_data = filtered_df.groupby(['weekday', 'hour']).size().reset_index(name='count')
-heatmap_pivot = heatmap_data.pivot(index='weekday', columns='hour', values='count')
-heatmap_pivot = heatmap_pivot.fillna(0)
+# Count incidents per weekday/hour cell directly into a 7x24 grid
+# (bincount over flat cell indices; much faster than the unbuffered np.add.at)
+cell_index = filtered_df['weekday'].to_numpy(dtype=np.intp) * 24 + filtered_df['hour'].to_numpy()
+heatmap_counts = np.bincount(cell_index, minlength=7 * 24).reshape(7, 24).astype(np.int32)
 
 
 # Create day labels
 day_labels = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
 
 
-# Create heatmap with warmer color scheme to match severity theme
-fig = px.imshow(
-    heatmap_pivot,
-    labels=dict(x="Hour of Day", y="Day of Week", color="Incidents"),
-    x=list(range(24)),
-    y=[day_labels[int(i)] for i in heatmap_pivot.index],
-    color_continuous_scale="OrRd",  # Orange to Red (matches severity theme)
-    aspect="auto",
-    title="Incident Heatmap: Day vs Hour"
-)
-fig.update_xaxes(side="bottom")
-fig.update_layout(height=400)
-st.plotly_chart(fig, use_container_width=True)
+@st.cache_data
+def make_heatmap(heatmap_counts, day_labels):
+    # Create heatmap with warmer color scheme to match severity theme
+    fig = px.imshow(
+        heatmap_counts,
+        labels=dict(x="Hour of Day", y="Day of Week", color="Incidents"),
+        x=np.arange(24, dtype=np.int8),  # Typed array, sent base64-encoded like z
+        y=day_labels,
+        color_continuous_scale="OrRd",  # Orange to Red (matches severity theme)
+        zmin=0,
+        zmax=max(int(heatmap_counts.max()), 1),  # Explicit range saves Plotly a client-side scan
+        aspect="auto",
+        title="Incident Heatmap: Day vs Hour"
+    )
+    fig.update_xaxes(side="bottom")
+    fig.update_layout(height=400)
+    return fig
+
+
+st.plotly_chart(make_heatmap(heatmap_counts, day_labels), use_container_width=True)
 
 
 # Find peak time
-if len(heatmap_data) > 0:
-    peak_hour = heatmap_data.loc[heatmap_data['count'].idxmax()]
-    st.info(f"🔥 **Peak incident time:** {day_labels[int(peak_hour['weekday'])]} at {int(peak_hour['hour'])}:00 ({int(peak_hour['count'])} incidents)")
+if len(filtered_df) > 0:
+    peak_day, peak_hour = np.unravel_index(heatmap_counts.argmax(), heatmap_counts.shape)
+    st.info(f"🔥 **Peak incident time:** {day_labels[peak_day]} at {peak_hour}:00 ({heatmap_counts[peak_day, peak_hour]} incidents)")
 
 
 # Route Deep Dive with Tabs
@@ -241,31 +398,22 @@ st.markdown("---")
 st.subheader("🔍 Route Deep Dive Analysis")
 
 
-# Route selector (applies to all tabs)
-top_routes = df['route'].value_counts().head(5).index.tolist()
-selected_deep_dive_route = st.selectbox(
-    "Select Route to Analyze",
-    options=top_routes,
-    index=1 if '504' in top_routes else 0
-)
-
-
-# Create tabs for different time periods
-tab1, tab2, tab3 = st.tabs(["🌅 Morning Rush (5-9 AM)", "☀️ Afternoon Rush (1-6 PM)", "🎯 What-If Scenarios"])
-
-
 # Helper function to generate smart recommendations
-def generate_recommendations(route_data, route_name, time_period, start_hour, end_hour):
+def generate_recommendations(window_counts, route_name, time_period, start_hour, end_hour):
     """Generate data-driven recommendations based on incident patterns"""
     
-    total_incidents = len(route_data)
-    high_severity = route_data['delay_bin'].isin(['High', 'Severe']).sum()
+    # window_counts holds incidents per hour (rows) and severity (columns)
+    hourly_counts = window_counts.to_numpy().sum(axis=1)
+    total_incidents = int(hourly_counts.sum())
+    high_severity = int(window_counts[['High', 'Severe']].to_numpy().sum())
     high_severity_pct = (high_severity / total_incidents * 100) if total_incidents > 0 else 0
     
-    # Find peak hour in this window
-    hourly_counts = route_data.groupby('hour').size()
-    peak_hour = hourly_counts.idxmax() if len(hourly_counts) > 0 else start_hour
-    peak_count = hourly_counts.max() if len(hourly_counts) > 0 else 0
+    # Find peak hour in this window (one argmax gives both the hour and its count)
+    if len(hourly_counts) > 0:
+        peak = hourly_counts.argmax()
+        peak_hour, peak_count = window_counts.index[peak], hourly_counts[peak]
+    else:
+        peak_hour, peak_count = start_hour, 0
     
     # Build smart recommendations
     recommendations = []
@@ -301,249 +449,270 @@ def generate_recommendations(route_data, route_name, time_period, start_hour, en
     return recommendations
 
 
-# TAB 1: Morning Rush
-with tab1:
-    st.markdown(f"**Analyzing Route {selected_deep_dive_route}** during morning rush hours (5:00-9:00 AM)")
+# Scenario estimates only depend on the route and the four scenario inputs
+@st.cache_data
+def compute_scenario(_route_hour_counts, route, start_hour, end_hour, intervention_type, intervention_strength):
+    baseline_incidents = route_window(_route_hour_counts, route, start_hour, end_hour)
+    baseline_count = int(baseline_incidents.to_numpy().sum())
+    baseline_high_severity = int(baseline_incidents[['High', 'Severe']].to_numpy().sum())
     
-    route_morning = df[
-        (df['route'] == selected_deep_dive_route) & 
-        (df['hour'] >= 5) & 
-        (df['hour'] <= 9)
-    ]
+    # Estimation model
+    impact_factor = {
+        "Additional Maintenance Crew": 0.15,
+        "Pre-Service Inspection": 0.20,
+        "Backup Vehicle": 0.10
+    }
+    factor = impact_factor[intervention_type]
+    level = intervention_strength / 10
     
-    if len(route_morning) > 0:
-        st.write(f"Found **{len(route_morning):,} incidents** during this period")
-        
-        col1, col2 = st.columns(2)
+    estimated_reduction = int(baseline_count * factor * level)
+    estimated_severity_reduction = int(baseline_high_severity * factor * level * 1.5)
+    
+    # Monthly cost-benefit (30 days)
+    crew_cost_per_hour = 50
+    hours_deployed = end_hour - start_hour
+    intervention_cost = crew_cost_per_hour * hours_deployed * intervention_strength * 30
+    
+    incident_cost = 500
+    savings = estimated_reduction * incident_cost * 30
+    
+    roi = ((savings - intervention_cost) / intervention_cost) * 100 if intervention_cost > 0 else 0
+    
+    return (baseline_count, baseline_high_severity, estimated_reduction, estimated_severity_reduction,
+            intervention_cost, savings, roi)
+
+
+# The deep dive only reads its own widgets, so as a fragment the route picker
+# and scenario inputs rerun just this section, not the whole dashboard
+@st.fragment
+def render_deep_dive(top_routes, route_hour_counts):
+    # Route selector (applies to all tabs)
+    selected_deep_dive_route = st.selectbox(
+        "Select Route to Analyze",
+        options=top_routes,
+        index=1 if '504' in top_routes else 0
+    )
+
+    # Create tabs for different time periods
+    tab1, tab2, tab3 = st.tabs(["🌅 Morning Rush (5-9 AM)", "☀️ Afternoon Rush (1-6 PM)", "🎯 What-If Scenarios"])
+
+    # TAB 1: Morning Rush
+    with tab1:
+        st.markdown(f"**Analyzing Route {selected_deep_dive_route}** during morning rush hours (5:00-9:00 AM)")
         
-        with col1:
-            hourly = route_morning.groupby('hour').size()
-            fig = px.line(
-                x=hourly.index,
-                y=hourly.values,
-                markers=True,
-                labels={'x': 'Hour', 'y': 'Incidents'},
-                title=f"Route {selected_deep_dive_route}: Hourly Pattern"
-            )
-            fig.update_traces(line_color='#c0392b', marker=dict(size=10))
-            st.plotly_chart(fig, use_container_width=True)
+        route_morning = route_window(route_hour_counts, selected_deep_dive_route, 5, 9)
+        morning_total = int(route_morning.to_numpy().sum())
         
-        with col2:
-            severity = route_morning['delay_bin'].value_counts()
-            severity_ordered = ['Severe', 'High', 'Medium', 'Low']
-            severity_data = [severity.get(s, 0) for s in severity_ordered]
+        if morning_total > 0:
+            st.write(f"Found **{morning_total:,} incidents** during this period")
+            
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                hourly = route_morning.sum(axis=1)
+                fig = px.line(
+                    x=hourly.index,
+                    y=hourly.values,
+                    markers=True,
+                    labels={'x': 'Hour', 'y': 'Incidents'},
+                    title=f"Route {selected_deep_dive_route}: Hourly Pattern"
+                )
+                fig.update_traces(line_color='#c0392b', marker=dict(size=10))
+                st.plotly_chart(fig, use_container_width=True)
             
-            fig = px.pie(
-                values=severity_data,
-                names=severity_ordered,
-                title="Severity Distribution",
-                color=severity_ordered,
-                color_discrete_map=SEVERITY_COLORS,
-                category_orders={'names': severity_ordered}
+            with col2:
+                severity_ordered = ['Severe', 'High', 'Medium', 'Low']
+                severity_data = route_morning.sum().reindex(severity_ordered, fill_value=0).to_numpy()
+                
+                fig = px.pie(
+                    values=severity_data,
+                    names=severity_ordered,
+                    title="Severity Distribution",
+                    color=severity_ordered,
+                    color_discrete_map=SEVERITY_COLORS,
+                    category_orders={'names': severity_ordered}
+                )
+                st.plotly_chart(fig, use_container_width=True)
+            
+            # Generate smart recommendations
+            recommendations = generate_recommendations(
+                route_morning, 
+                selected_deep_dive_route, 
+                "morning rush",
+                5, 9
             )
-            st.plotly_chart(fig, use_container_width=True)
-        
-        # Generate smart recommendations
-        recommendations = generate_recommendations(
-            route_morning, 
-            selected_deep_dive_route, 
-            "morning rush",
-            5, 9
-        )
-        
-        st.success(f"""
+            
+            st.success(f"""
 ### 💡 Data-Driven Recommendations for Route {selected_deep_dive_route} (Morning):
 
 
 {chr(10).join(f"- {rec}" for rec in recommendations)}
         """)
-    else:
-        st.warning(f"No Route {selected_deep_dive_route} data found for morning hours")
+        else:
+            st.warning(f"No Route {selected_deep_dive_route} data found for morning hours")
 
-
-# TAB 2: Afternoon Rush
-with tab2:
-    st.markdown(f"**Analyzing Route {selected_deep_dive_route}** during afternoon rush hours (1:00-6:00 PM)")
-    
-    route_afternoon = df[
-        (df['route'] == selected_deep_dive_route) & 
-        (df['hour'] >= 13) &  # 1 PM
-        (df['hour'] <= 18)     # 6 PM
-    ]
-    
-    if len(route_afternoon) > 0:
-        st.write(f"Found **{len(route_afternoon):,} incidents** during this period")
+    # TAB 2: Afternoon Rush
+    with tab2:
+        st.markdown(f"**Analyzing Route {selected_deep_dive_route}** during afternoon rush hours (1:00-6:00 PM)")
         
-        col1, col2 = st.columns(2)
+        route_afternoon = route_window(route_hour_counts, selected_deep_dive_route, 13, 18)  # 1 PM - 6 PM
+        afternoon_total = int(route_afternoon.to_numpy().sum())
         
-        with col1:
-            hourly = route_afternoon.groupby('hour').size()
-            # Convert 24hr to 12hr for display
-            hour_labels = {13: '1 PM', 14: '2 PM', 15: '3 PM', 16: '4 PM', 17: '5 PM', 18: '6 PM'}
+        if afternoon_total > 0:
+            st.write(f"Found **{afternoon_total:,} incidents** during this period")
             
-            fig = px.line(
-                x=[hour_labels.get(h, h) for h in hourly.index],
-                y=hourly.values,
-                markers=True,
-                labels={'x': 'Hour', 'y': 'Incidents'},
-                title=f"Route {selected_deep_dive_route}: Hourly Pattern"
-            )
-            fig.update_traces(line_color='#c0392b', marker=dict(size=10))
-            st.plotly_chart(fig, use_container_width=True)
-        
-        with col2:
-            severity = route_afternoon['delay_bin'].value_counts()
-            severity_ordered = ['Severe', 'High', 'Medium', 'Low']
-            severity_data = [severity.get(s, 0) for s in severity_ordered]
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                hourly = route_afternoon.sum(axis=1)
+                # Convert 24hr to 12hr for display
+                hour_labels = {13: '1 PM', 14: '2 PM', 15: '3 PM', 16: '4 PM', 17: '5 PM', 18: '6 PM'}
+                
+                fig = px.line(
+                    x=[hour_labels.get(h, h) for h in hourly.index],
+                    y=hourly.values,
+                    markers=True,
+                    labels={'x': 'Hour', 'y': 'Incidents'},
+                    title=f"Route {selected_deep_dive_route}: Hourly Pattern"
+                )
+                fig.update_traces(line_color='#c0392b', marker=dict(size=10))
+                st.plotly_chart(fig, use_container_width=True)
             
-            fig = px.pie(
-                values=severity_data,
-                names=severity_ordered,
-                title="Severity Distribution",
-                color=severity_ordered,
-                color_discrete_map=SEVERITY_COLORS,
-                category_orders={'names': severity_ordered}
+            with col2:
+                severity_ordered = ['Severe', 'High', 'Medium', 'Low']
+                severity_data = route_afternoon.sum().reindex(severity_ordered, fill_value=0).to_numpy()
+                
+                fig = px.pie(
+                    values=severity_data,
+                    names=severity_ordered,
+                    title="Severity Distribution",
+                    color=severity_ordered,
+                    color_discrete_map=SEVERITY_COLORS,
+                    category_orders={'names': severity_ordered}
+                )
+                st.plotly_chart(fig, use_container_width=True)
+            
+            # Generate smart recommendations
+            recommendations = generate_recommendations(
+                route_afternoon, 
+                selected_deep_dive_route, 
+                "afternoon rush",
+                13, 18
             )
-            st.plotly_chart(fig, use_container_width=True)
-        
-        # Generate smart recommendations
-        recommendations = generate_recommendations(
-            route_afternoon, 
-            selected_deep_dive_route, 
-            "afternoon rush",
-            13, 18
-        )
-        
-        st.success(f"""
+            
+            st.success(f"""
 ### 💡 Data-Driven Recommendations for Route {selected_deep_dive_route} (Afternoon):
 
 {chr(10).join(f"- {rec}" for rec in recommendations)}
         """)
-    else:
-        st.warning(f"No Route {selected_deep_dive_route} data found for afternoon hours")
-
-# ============================================================================
-# What-If Scenario Planning Tab
-# ============================================================================
-# TAB 3: What-If Scenario Analysis
-with tab3:
-    st.markdown(f"**Scenario Planning for Route {selected_deep_dive_route}**")
-    st.markdown("""
+        else:
+            st.warning(f"No Route {selected_deep_dive_route} data found for afternoon hours")
+
+    # ============================================================================
+    # What-If Scenario Planning Tab
+    # ============================================================================
+    # TAB 3: What-If Scenario Analysis
+    with tab3:
+        st.markdown(f"**Scenario Planning for Route {selected_deep_dive_route}**")
+        st.markdown("""
     Use this tool to estimate the impact of operational changes.
     **Note:** Estimates based on historical patterns, not guaranteed outcomes.
     """)
-    
-    # Scenario inputs
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        scenario_time_start = st.slider("Time Window Start", 0, 23, 5, key="scenario_start")
-        scenario_time_end = st.slider("Time Window End", scenario_time_start, 23, 9, key="scenario_end")
         
-    with col2:
-        intervention_type = st.selectbox(
-            "Intervention Type",
-            ["Additional Maintenance Crew", "Pre-Service Inspection", "Backup Vehicle"]
-        )
-        intervention_strength = st.slider(
-            "Intervention Level",
-            min_value=1,
-            max_value=10,
-            value=5,
-            help="1 = minimal, 10 = maximum resource allocation"
-        )
-    
-    # Calculate scenario
-    baseline_incidents = df[
-        (df['route'] == selected_deep_dive_route) &
-        (df['hour'].between(scenario_time_start, scenario_time_end))
-    ]
-    
-    baseline_count = len(baseline_incidents)
-    baseline_high_severity = (baseline_incidents['delay_bin'].isin(['High', 'Severe'])).sum()
-    
-    # Estimation model
-    impact_factor = {
-        "Additional Maintenance Crew": 0.15,
-        "Pre-Service Inspection": 0.20,
-        "Backup Vehicle": 0.10
-    }
-    
-    estimated_reduction = int(baseline_count * impact_factor[intervention_type] * (intervention_strength / 10))
-    estimated_severity_reduction = int(baseline_high_severity * impact_factor[intervention_type] * (intervention_strength / 10) * 1.5)
-    
-    # Display results
-    st.subheader("Estimated Impact")
-    
-    col1, col2, col3 = st.columns(3)
-    
-    with col1:
-        st.metric(
-            "Baseline Incidents",
-            baseline_count
-        )
-    
-    with col2:
-        st.metric(
-            "Estimated After Intervention",
-            baseline_count - estimated_reduction,
-            delta=f"-{estimated_reduction} incidents",
-            delta_color="inverse"
+        # Scenario inputs
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            scenario_time_start = st.slider("Time Window Start", 0, 23, 5, key="scenario_start")
+            scenario_time_end = st.slider("Time Window End", scenario_time_start, 23, 9, key="scenario_end")
+            
+        with col2:
+            intervention_type = st.selectbox(
+                "Intervention Type",
+                ["Additional Maintenance Crew", "Pre-Service Inspection", "Backup Vehicle"]
+            )
+            intervention_strength = st.slider(
+                "Intervention Level",
+                min_value=1,
+                max_value=10,
+                value=5,
+                help="1 = minimal, 10 = maximum resource allocation"
+            )
+        
+        # Calculate scenario
+        (baseline_count, baseline_high_severity, estimated_reduction, estimated_severity_reduction,
+         intervention_cost, savings, roi) = compute_scenario(
+            route_hour_counts, selected_deep_dive_route,
+            scenario_time_start, scenario_time_end, intervention_type, intervention_strength
         )
-    
-    with col3:
-        reduction_pct = (estimated_reduction / baseline_count) * 100 if baseline_count > 0 else 0
-        st.metric(
-            "Estimated Reduction",
-            f"{reduction_pct:.1f}%"
+        
+        # Display results
+        st.subheader("Estimated Impact")
+        
+        col1, col2, col3 = st.columns(3)
+        
+        with col1:
+            st.metric(
+                "Baseline Incidents",
+                baseline_count
+            )
+        
+        with col2:
+            st.metric(
+                "Estimated After Intervention",
+                baseline_count - estimated_reduction,
+                delta=f"-{estimated_reduction} incidents",
+                delta_color="inverse"
+            )
+        
+        with col3:
+            reduction_pct = (estimated_reduction / baseline_count) * 100 if baseline_count > 0 else 0
+            st.metric(
+                "Estimated Reduction",
+                f"{reduction_pct:.1f}%"
+            )
+        
+        # Cost-benefit analysis
+        st.markdown("**Cost-Benefit Estimate**")
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.metric("Monthly Intervention Cost", f"${intervention_cost:,}")
+            st.metric("Estimated Monthly Savings", f"${savings:,}")
+        
+        with col2:
+            st.metric("Net Monthly Benefit", f"${savings - intervention_cost:,}")
+            st.metric("ROI", f"{roi:.1f}%")
+        
+        if roi > 0:
+            st.success(f"**Positive ROI:** This intervention is estimated to save **${savings - intervention_cost:,}/month**")
+        else:
+            st.warning("**Negative ROI:** Consider adjusting intervention level or exploring alternative approaches")
+
+        st.markdown("  ")
+        # Visual comparison
+        st.subheader("Before vs After Comparison")
+        
+        comparison_data = pd.DataFrame({
+            'Scenario': ['Baseline', 'With Intervention'],
+            'Total Incidents': [baseline_count, baseline_count - estimated_reduction],
+            'High Severity': [baseline_high_severity, baseline_high_severity - estimated_severity_reduction]
+        })
+        
+        fig = px.bar(
+            comparison_data,
+            x='Scenario',
+            y=['Total Incidents', 'High Severity'],
+            barmode='group',
+            title="Projected Impact of Intervention",
+            color_discrete_sequence=['#e67e22', '#c0392b']
         )
-    
-    # Cost-benefit analysis
-    st.markdown("**Cost-Benefit Estimate**")
-    
-    crew_cost_per_hour = 50
-    hours_deployed = scenario_time_end - scenario_time_start
-    intervention_cost = crew_cost_per_hour * hours_deployed * intervention_strength * 30
-    
-    incident_cost = 500
-    savings = estimated_reduction * incident_cost * 30
-    
-    roi = ((savings - intervention_cost) / intervention_cost) * 100 if intervention_cost > 0 else 0
-    
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        st.metric("Monthly Intervention Cost", f"${intervention_cost:,}")
-        st.metric("Estimated Monthly Savings", f"${savings:,}")
-    
-    with col2:
-        st.metric("Net Monthly Benefit", f"${savings - intervention_cost:,}")
-        st.metric("ROI", f"{roi:.1f}%")
-    
-    if roi > 0:
-        st.success(f"**Positive ROI:** This intervention is estimated to save **${savings - intervention_cost:,}/month**")
-    else:
-        st.warning("**Negative ROI:** Consider adjusting intervention level or exploring alternative approaches")
+        st.plotly_chart(fig, use_container_width=True)
+
+
+render_deep_dive(base['top_routes'], compute_route_hour_counts(df))
 
-    st.markdown("  ")
-    # Visual comparison
-    st.subheader("Before vs After Comparison")
-    
-    comparison_data = pd.DataFrame({
-        'Scenario': ['Baseline', 'With Intervention'],
-        'Total Incidents': [baseline_count, baseline_count - estimated_reduction],
-        'High Severity': [baseline_high_severity, baseline_high_severity - estimated_severity_reduction]
-    })
-    
-    fig = px.bar(
-        comparison_data,
-        x='Scenario',
-        y=['Total Incidents', 'High Severity'],
-        barmode='group',
-        title="Projected Impact of Intervention",
-        color_discrete_sequence=['#e67e22', '#c0392b']
-    )
-    st.plotly_chart(fig, use_container_width=True)
 
 # ============================================================================
 # Resource Allocation Recommendations Section
@@ -559,32 +728,7 @@ would have the greatest impact on reducing incidents and delays.
 """)
 
 
-# Calculate priority score for each route-time combination
-priority_data = []
-
-
-for route in df['route'].unique():
-    for hour in range(24):
-        subset = df[(df['route'] == route) & (df['hour'] == hour)]
-        if len(subset) > 0:
-            incident_count = len(subset)
-            severity_score = (subset['delay_bin'] == 'Severe').sum() * 3 + \
-                            (subset['delay_bin'] == 'High').sum() * 2 + \
-                            (subset['delay_bin'] == 'Medium').sum() * 1
-            
-            # Priority score weighs both volume and severity
-            priority_score = incident_count * 0.6 + severity_score * 0.4
-            
-            priority_data.append({
-                'route': route,
-                'hour': hour,
-                'incidents': incident_count,
-                'severity_score': severity_score,
-                'priority_score': priority_score
-            })
-
-
-priority_df = pd.DataFrame(priority_data).sort_values('priority_score', ascending=False)
+priority_df, hourly_priority, top_routes = compute_priority(df)
 
 
 # Display top priorities
@@ -593,18 +737,25 @@ st.markdown("*Routes and times where resource allocation would have the highest
 
 
 # Format the dataframe for display
-display_df = priority_df.head(20).copy()
-display_df['priority_score'] = display_df['priority_score'].round(1)
+top20 = priority_df.head(20)
+top20_incidents = int(top20['incidents'].sum())
+# Formatting is done client-side by column_config, so only raw values are sent
+display_df = top20.reset_index(drop=True)
 display_df.columns = ['Route', 'Hour', 'Incidents', 'Severity Score', 'Priority Score']
 
 
 st.dataframe(
-    display_df.style.background_gradient(
-        subset=['Priority Score'],
-        cmap='OrRd'
-    ),
+    display_df,
     use_container_width=True,
-    height=400
+    height=400,
+    hide_index=True,
+    column_config={
+        'Priority Score': st.column_config.ProgressColumn(
+            format="%.1f",
+            min_value=0,
+            max_value=float(display_df['Priority Score'].max())
+        )
+    }
 )
 
 
@@ -613,34 +764,34 @@ st.markdown("### Recommended Resource Allocation")
 st.markdown("*Detailed action plans for top 5 priority areas*")
 
 
-for idx, row in priority_df.head(5).iterrows():
-    with st.expander(f"🚊 Route {row['route']} at {int(row['hour'])}:00 - Priority Score: {row['priority_score']:.1f}"):
+for row in priority_df.head(5).itertuples(index=False):
+    with st.expander(f"🚊 Route {row.route} at {int(row.hour)}:00 - Priority Score: {row.priority_score:.1f}"):
         
         # Calculate recommended resources
-        crew_members = int(row['incidents'] / 30) + 1
-        estimated_reduction = int(row['incidents'] * 0.2)
-        severity_reduction = int(row['severity_score'] * 0.25)
+        crew_members = int(row.incidents / 30) + 1
+        estimated_reduction = int(row.incidents * 0.2)
+        severity_reduction = int(row.severity_score * 0.25)
         
         col1, col2 = st.columns(2)
         
         with col1:
             st.markdown("**📋 Current Situation:**")
-            st.write(f"- Historical incidents: **{int(row['incidents'])}**")
-            st.write(f"- Severity score: **{row['severity_score']:.1f}**")
-            st.write(f"- Time window: **{int(row['hour'])}:00-{int(row['hour'])+1}:00**")
+            st.write(f"- Historical incidents: **{int(row.incidents)}**")
+            st.write(f"- Severity score: **{row.severity_score:.1f}**")
+            st.write(f"- Time window: **{int(row.hour)}:00-{int(row.hour)+1}:00**")
         
         with col2:
             st.markdown("**🎯 Estimated Impact:**")
             st.write(f"- Potential reduction: **{estimated_reduction} incidents**")
             st.write(f"- Severity reduction: **{severity_reduction} points**")
-            st.write(f"- Impact percentage: **{(estimated_reduction/row['incidents']*100):.0f}%**")
+            st.write(f"- Impact percentage: **{(estimated_reduction/row.incidents*100):.0f}%**")
         
         st.markdown("**🔧 Recommended Actions:**")
         st.write(f"""
         1.  Deploy **{crew_members} additional maintenance crew members**
-        2.  Pre-position backup vehicle by **{int(row['hour']) - 1}:30**
+        2.  Pre-position backup vehicle by **{int(row.hour) - 1}:30**
         3.  Enhanced pre-service inspection for vehicles on this route
-        4.  Real-time monitoring during **{int(row['hour'])-1}:00-{int(row['hour'])+2}:00** window
+        4.  Real-time monitoring during **{int(row.hour)-1}:00-{int(row.hour)+2}:00** window
         5.  Dedicated dispatcher support during peak period
         """)
 
@@ -649,43 +800,43 @@ st.markdown("---")
 # Summary visualization
 st.markdown("### Priority Distribution by Hour")
 
-hourly_priority = priority_df.groupby('hour')['priority_score'].sum().reset_index()
-
-fig = px.area(
-    hourly_priority,
-    x='hour',
-    y='priority_score',
-    labels={'hour': 'Hour of Day', 'priority_score': 'Total Priority Score'},
-    title="When to Deploy Resources (Higher = More Critical)",
-    color_discrete_sequence=['#e67e22']
-)
-
-
-fig.update_layout(
-    xaxis=dict(
-        tickmode='linear',
-        tick0=0,
-        dtick=2
-    ),
-    height=400
-)
+# Built from the cached priority table, so this figure is only built once
+@st.cache_data
+def make_priority_area(_hourly_priority):
+    fig = px.area(
+        _hourly_priority,
+        x='hour',
+        y='priority_score',
+        labels={'hour': 'Hour of Day', 'priority_score': 'Total Priority Score'},
+        title="When to Deploy Resources (Higher = More Critical)",
+        color_discrete_sequence=['#e67e22']
+    )
+    
+    fig.update_layout(
+        xaxis=dict(
+            tickmode='linear',
+            tick0=0,
+            dtick=2
+        ),
+        height=400
+    )
+    return fig
 
 
-st.plotly_chart(fig, use_container_width=True)
+st.plotly_chart(make_priority_area(hourly_priority), use_container_width=True)
 
 
 # Key insights
 
 top_hour = hourly_priority.loc[hourly_priority['priority_score'].idxmax(), 'hour']
-top_routes = priority_df.groupby('route')['priority_score'].sum().sort_values(ascending=False).head(3)
 
 
 st.info(f"""
 ### Key Findings:
 - Highest priority hour: **{int(top_hour)}:00** (deploy maximum resources)
-- Top 3 routes requiring attention: **{', '.join(top_routes.index.tolist())}**
-- Total high-priority incidents: **{priority_df.head(20)['incidents'].sum():,.0f}**
-- Potential impact: Addressing top 20 areas could reduce **{int(priority_df.head(20)['incidents'].sum() * 0.2):,.0f} incidents/year**
+- Top 3 routes requiring attention: **{', '.join(top_routes)}**
+- Total high-priority incidents: **{top20_incidents:,}**
+- Potential impact: Addressing top 20 areas could reduce **{int(top20_incidents * 0.2):,} incidents/year**
 """)
 
 
@@ -0,0 +1,25 @@
+import pandas as pd
+
+
+# One-time conversion of the incident CSV to Parquet for the dashboard.
+# Re-run this whenever the CSV is updated:  python convert_to_parquet.py
+CSV_PATH = 'data/TTC_Feature_Engineered_2014_2025.csv'
+PARQUET_PATH = 'data/TTC_Feature_Engineered_2014_2025.parquet'
+
+
+# Compact dtypes: categoricals are written as dictionary-encoded columns
+# and come back as the same categoricals when the app reads the file
+df = pd.read_csv(
+    CSV_PATH,
+    dtype={
+        'hour': 'int8',
+        'weekday': 'int8',
+        'min_delay': 'float32',
+        'route': 'category',
+        'delay_bin': pd.CategoricalDtype(['Low', 'Medium', 'High', 'Severe'], ordered=True)
+    }
+)
+
+
+df.to_parquet(PARQUET_PATH, engine='pyarrow', compression='zstd', index=False)
+print(f"Wrote {len(df):,} rows to {PARQUET_PATH}")